@@ -13,8 +13,30 @@ Outputs:
 Authors: Sebastian Mieruch (sebastian.mieruch@awi.de)
 """
 
+import argparse
+import datetime as dt
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+from collections import deque
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from operator import itemgetter
 from pathlib import Path
+from typing import NamedTuple
+import numpy as np
 import pandas as pd
+from openpyxl import load_workbook
 pd.set_option("display.max_columns", None)
 pd.set_option("display.width", None)
 
@@ -22,11 +44,26 @@ pd.set_option("display.width", None)
 ###-------------------set parameters-------------------###
 INPUT_XLSX = Path("Abiotics ODV Quality Flags.xlsx")
 SHEET_NAMES = ["Abiotics Sea", "Abiotics Pool", "Abiotics Harbour"]
-HEADER_FILE = Path("helgoland_odv_header.txt")
+HEADER_FILE = None #hand-maintained header, e.g. Path("helgoland_odv_header.txt"), None = generate from SPEC
 CRUISE_NAME = "Helgoland_OpenSea"
 #STATION_NAME = "Felswatt" -> we will use the SHEET_NAMES
 TYPE_NAME = "B"
-OUTFILE = Path("Helgoland_OpenSea.txt")
+OUTFILE = Path("Helgoland_OpenSea.txt") #.txt.gz or .txt.zst -> compressed output
+CHUNKSIZE = None #rows per chunk in streaming mode, None = whole sheet at once
+WORKERS = 1 #number of processes converting sheets in parallel
+WRITE_ROWS = 100_000 #rows serialized per write
+WRITE_BUFFER = 8 * 1024 * 1024 #bytes buffered by the output file handle
+COMPRESS_LEVEL = None #gzip/zstd level, None = codec default (gzip 6, zstd 3)
+COMPRESS_THREADS = 1 #threads compressing the output
+SPLIT = None #"station" or "station-year" -> one output file per station (and year)
+WRITE_THREADS = 4 #threads writing the split output files
+NETCDF_FILE = None #additional CF NetCDF output, e.g. Path("Helgoland_OpenSea.nc")
+NETCDF_CHUNK = 4096 #observations per NetCDF chunk
+SQLITE_FILE = None #additional SQLite database with upserts on (Station, time), e.g. Path("Helgoland_OpenSea.sqlite")
+DB_BATCH = 10_000 #rows per executemany
+PARQUET_DIR = None #additional Parquet dataset partitioned by station and year, e.g. Path("Helgoland_OpenSea.parquet")
+CACHE_DIR = None #Parquet cache of parsed sheets, e.g. Path(".sheet_cache"), None = off
+CACHE_MAX_MB = 1024 #size cap of the cache, least recently used sheets are evicted
 ###
 ###---new meta variables---###
 #INSTRUMENT_TEMPERATURE = ""
@@ -40,24 +77,88 @@ OUTFILE = Path("Helgoland_OpenSea.txt")
 
 ###-------------helper functions---------------------------------------###
 def date_to_iso(df: pd.DataFrame, **_) -> pd.Series:
+    ###vectorized: Year/Month/Day -> datetime64, Time (datetime.time) folded in as seconds,
+    ###then formatted by numpy in one pass
+    ###falls back to string concatenation where the result would not be identical
+    year = df["Year"].astype("int64").to_numpy()
+    month = df["Month"].astype("int64").to_numpy()
+    day = df["Day"].astype("int64").to_numpy()
+    if len(df) == 0 or year.min() < 1000 or year.max() > 9999:
+        return _date_to_iso_str(df)
+
+    months = (year - 1970) * 12 + (month - 1)
+    dates = (
+        months.astype("datetime64[M]").astype("datetime64[D]")
+        + (day - 1).astype("timedelta64[D]")
+    )
+    #invalid dates (e.g. 31 February) would roll over -> keep today's strings for them
+    if (
+        (month < 1).any() or (month > 12).any() or (day < 1).any()
+        or (dates.astype("datetime64[M]").astype("int64") != months).any()
+    ):
+        return _date_to_iso_str(df)
+
+    seconds = _time_to_seconds(df["Time"]) if "Time" in df.columns else np.full(len(df), np.nan)
+    if seconds is None:
+        #Time is not a plain time of day (e.g. text) -> append it as string
+        return pd.Series(np.datetime_as_string(dates, unit="D"), index=df.index) + _time_suffix(df)
+
+    #observations are taken at a few times per day -> format every distinct
+    #(date, time) only once, key = day number * 86401 + second of day (86400 = no time)
+    has_time = ~np.isnan(seconds)
+    key = dates.astype("int64") * 86401 + np.where(has_time, seconds, 86400).astype("int64")
+
+    def iso_format(keys: np.ndarray) -> np.ndarray:
+        days, secs = np.divmod(keys, 86401)
+        stamps = days.astype("datetime64[D]").astype("datetime64[s]") + np.where(secs < 86400, secs, 0).astype("timedelta64[s]")
+        iso = np.datetime_as_string(stamps, unit="s")
+        return np.where(secs < 86400, iso, iso.astype("U10")) #"yyyy-mm-dd" if there is no time
+
+    return pd.Series(factorized_format(key, iso_format), index=df.index)
+
+
+###format only the distinct values and scatter the results back by code
+###formatter gets the array of distinct values and returns their strings, missing -> ""
+def factorized_format(values, formatter) -> np.ndarray:
+    codes, uniques = pd.factorize(values)
+    formatted = np.empty(len(uniques) + 1, dtype=object)
+    formatted[:-1] = formatter(np.asarray(uniques))
+    formatted[-1] = "" #code -1 = missing
+    return formatted[codes]
+
+
+###seconds since midnight for a column of datetime.time values (NaN = no time)
+###None if the column holds anything else or str() would show microseconds
+###only the distinct times are converted, there are few of them per column
+def _time_to_seconds(xtime: pd.Series):
+    codes, uniques = pd.factorize(xtime.to_numpy(dtype=object))
+    seconds = np.empty(len(uniques) + 1)
+    seconds[-1] = np.nan #code -1 = missing
+    for i, t in enumerate(uniques):
+        if not isinstance(t, dt.time) or t.microsecond != 0 or t.tzinfo is not None:
+            return None
+        seconds[i] = t.hour * 3600 + t.minute * 60 + t.second
+    return seconds[codes]
+
+
+def _time_suffix(df: pd.DataFrame) -> pd.Series:
     ###empty Time values are read as NaN
     ###replace empty as ""
     if "Time" in df.columns:
-        xtime = (
-            df["Time"]
-            .where(df["Time"].isna(), "T" + df["Time"].astype(str))
-            .fillna("")
-        )
-    else:
-        xtime = pd.Series("", index=df.index)
-    
+        suffix = factorized_format(df["Time"], lambda times: ["T" + str(t) for t in times])
+        return pd.Series(suffix, index=df.index)
+    return pd.Series("", index=df.index)
+
+
+###plain string version of date_to_iso, used for values numpy cannot represent
+def _date_to_iso_str(df: pd.DataFrame) -> pd.Series:
     return (
         df["Year"].astype(int).astype(str)
         + "-"
         + df["Month"].astype(int).astype(str).str.zfill(2)
         + "-"
         + df["Day"].astype(int).astype(str).str.zfill(2)
-        + xtime
+        + _time_suffix(df)
     )
 
 
@@ -69,116 +170,1879 @@ def add_station_name(df: pd.DataFrame, sheet_name: str, **_) -> str:
 ###------------------create data model------------------###
 """
 SPEC is the data model that can be easily extended.
-Keep in mind to adapt the header file if SPEC is changed!
+The ODV header is generated from SPEC (see render_header).
 3 rules are available:
 - "const" just adds a constant to the output
 - "fn" applies a function to the input, then maps the transformed data to output
+  (list the input columns the function needs under "cols", those read as numbers under "numeric")
 - "ref" copies a column to new output
 - "src" just copies input to output
 
 We will loop over SPEC keys and apply what is defined in the values (rules).
+Only the input columns named by "src" and "cols" are read from the xlsx.
+
+Header information per output column:
+- "label" column label in the ODV file (default: the SPEC key)
+- "meta" / "data" makes the column an ODV MetaVariable / DataVariable,
+  with value_type, significant_digits (decimals), var_type (meta), comment,
+  key_variable, is_primary_variable (data) and "p01", the NERC P01 code
+  https://vocab.nerc.ac.uk/collection/P01/current/ which is added to the comment
+Columns without "meta"/"data" (the date column, QV flags) get no variable line.
 """
 SPEC = {
-    "Cruise": {"const": CRUISE_NAME},
-    "Station": {"fn": add_station_name},
-    "Type": {"const": TYPE_NAME},
-    "yyyy-mm-ddThh:mm": {"fn": date_to_iso},
-    "xlon": {"src": "Longitude [degrees_east]"},
-    "xlat": {"src": "Latitude [degrees_north]"},
-    "time_ISO8601": {"ref": "yyyy-mm-ddThh:mm"},
-    #use later in header https://vocab.nerc.ac.uk/collection/P01/current/TEMPP901/
-    "Temperature Sea [~^o~#C]": {"src": "Temperature °C (Sea)"},
+    "Cruise": {"const": CRUISE_NAME, "meta": {"var_type": "METACRUISE", "value_type": "INDEXED_TEXT"}},
+    "Station": {"fn": add_station_name, "meta": {"var_type": "METASTATION", "value_type": "TEXT:21"}},
+    "Type": {"const": TYPE_NAME, "meta": {"var_type": "METATYPE", "value_type": "TEXT:2"}},
+    "yyyy-mm-ddThh:mm": {"fn": date_to_iso, "cols": ["Year", "Month", "Day", "Time"], "numeric": ["Year", "Month", "Day"]},
+    "xlon": {
+        "src": "Longitude [degrees_east]", "label": "Longitude [degrees_east]",
+        "meta": {"var_type": "METALONGITUDE", "value_type": "FLOAT", "significant_digits": 3},
+    },
+    "xlat": {
+        "src": "Latitude [degrees_north]", "label": "Latitude [degrees_north]",
+        "meta": {"var_type": "METALATITUDE", "value_type": "FLOAT", "significant_digits": 3},
+    },
+    "time_ISO8601": {
+        "ref": "yyyy-mm-ddThh:mm",
+        "data": {"value_type": "DOUBLE", "significant_digits": 4, "is_primary_variable": "T"},
+    },
+    "Temperature Sea [~^o~#C]": {
+        "src": "Temperature °C (Sea)",
+        "data": {
+            "value_type": "FLOAT", "significant_digits": 2, "key_variable": "1",
+            "comment": "Temperature (ITS-90) of the water body", "p01": "TEMPP901",
+        },
+    },
     "QV:SEADATANET:Temperature Sea [~^o~#C]": {"src": "QV:SEADATANET:Temperature °C (Sea)"},
-    "Temperature Air [~^o~#C]": {"src": "Temperature °C (Air)"},
+    "Temperature Air [~^o~#C]": {
+        "src": "Temperature °C (Air)",
+        "data": {"value_type": "FLOAT", "significant_digits": 2},
+    },
     "QV:SEADATANET:Temperature Air [~^o~#C]": {"src": "QV:SEADATANET:Temperature °C (Air)"},
-    #https://vocab.nerc.ac.uk/collection/P01/current/PHXXZZXX/
-    "pH": {"src": "pH-value"},
+    "pH": {
+        "src": "pH-value",
+        "data": {
+            "value_type": "FLOAT", "significant_digits": 2, "key_variable": "3",
+            "comment": "pH (unspecified scale) of the water body", "p01": "PHXXZZXX",
+        },
+    },
     "QV:SEADATANET:pH": {"src": "QV:SEADATANET:pH-value"},
-    #https://vocab.nerc.ac.uk/collection/P01/current/PSALZZXX/
-    "Practical Salinity": {"src": "Practical Salinity (‰)"},
+    "Practical Salinity": {
+        "src": "Practical Salinity (‰)",
+        "data": {
+            "value_type": "FLOAT", "significant_digits": 2, "key_variable": "4",
+            "comment": "Practical salinity of the water body by computation using UNESCO 1983 algorithm",
+            "p01": "PSALZZXX",
+        },
+    },
     "QV:SEADATANET:Practical Salinity": {"src": "QV:SEADATANET:Practical Salinity (‰)"},
-    "Wind Speed [m/s]": {"src": "Wind speed (m/s)"},
+    "Wind Speed [m/s]": {"src": "Wind speed (m/s)", "data": {"value_type": "FLOAT", "significant_digits": 2}},
     "QV:SEADATANET:Wind Speed [m/s]": {"src": "QV:SEADATANET:Wind speed (m/s)"},
-    "Illuminance [lux]": {"src": "Light intensity (lux)"},
+    "Illuminance [lux]": {"src": "Light intensity (lux)", "data": {"value_type": "FLOAT", "significant_digits": 2}},
     "QV:SEADATANET:Illuminance [lux]": {"src": "QV:SEADATANET:Light intensity (lux)"},
-    "Secchi depth [m]": {"src": "Secchi depth (m)"},
+    "Secchi depth [m]": {"src": "Secchi depth (m)", "data": {"value_type": "FLOAT", "significant_digits": 2}},
     "QV:SEADATANET:Secchi depth [m]": {"src": "QV:SEADATANET:Secchi depth (m)"},
-    "Euphotic zone (Secchi depth x 2) [m]": {"src": "Euphotic zone (Secchi depth x 2) (m)"},
-    "1/2 Secchi depth [m]": {"src": "1/2 Secchi depth (m)"},
-    "Color of Forel-Ule scale at 1/2 Secchi depth": {"src": "Color of Forel-Ule scale at 1/2 Secchi depth"},
-    "Time TNW": {"src": "Time TNW"},    
-    "Weather": {"src": "Weather"},
-    "Group": {"src": "Group"},
-    "Comment": {"src": "Comment"},
-    "Measurement instrument": {"src": "Measurement instrument"}
+    "Euphotic zone (Secchi depth x 2) [m]": {
+        "src": "Euphotic zone (Secchi depth x 2) (m)",
+        "data": {"value_type": "FLOAT", "significant_digits": 2},
+    },
+    "1/2 Secchi depth [m]": {"src": "1/2 Secchi depth (m)", "data": {"value_type": "FLOAT", "significant_digits": 2}},
+    "Color of Forel-Ule scale at 1/2 Secchi depth": {
+        "src": "Color of Forel-Ule scale at 1/2 Secchi depth",
+        "data": {"value_type": "FLOAT", "significant_digits": 2},
+    },
+    "Time TNW": {
+        "src": "Time TNW",
+        "data": {
+            "value_type": "INDEXED_TEXT",
+            "comment": "v TNW=before tide low, TNW=at tide low, n TNW=after tide low",
+        },
+    },
+    "Weather": {"src": "Weather", "data": {"value_type": "INDEXED_TEXT"}},
+    "Group": {"src": "Group", "data": {"value_type": "INDEXED_TEXT"}},
+    "Comment": {"src": "Comment", "data": {"value_type": "INDEXED_TEXT"}},
+    "Measurement instrument": {"src": "Measurement instrument", "data": {"value_type": "INDEXED_TEXT"}},
 }
+STATION_COLUMN = "Station"
+TIME_COLUMN = "yyyy-mm-ddThh:mm"
 
 
-###take the xlsx sheet and loop over the SPEC and apply rules -> association xlsx to odv
-def transform_one_file(df_in: pd.DataFrame, sheet_name: str) -> pd.DataFrame:
-    out = pd.DataFrame(index=df_in.index)
+###input columns needed by SPEC -> column projection for the reader
+def spec_columns(spec: dict = SPEC) -> list:
+    cols = []
+    for rule in spec.values():
+        for c in [rule["src"]] if "src" in rule else rule.get("cols", []):
+            if c not in cols:
+                cols.append(c)
+    return cols
 
-    for out_col, rule in SPEC.items():
+
+###dtype of every input column, the same for all readers and chunks -> the output does not
+###depend on what else is in a sheet or chunk (e.g. int vs. float when a column has NaN)
+###"src" of numeric variables and "numeric" of "fn" rules -> float64, everything else object
+def input_dtypes(spec: dict = SPEC) -> dict:
+    dtypes = dict.fromkeys(spec_columns(spec), "object")
+    for rule in spec.values():
+        value_type = rule.get("meta", rule.get("data", {})).get("value_type")
+        if "src" in rule and value_type in ("FLOAT", "DOUBLE", "BYTE", "SHORT", "INTEGER"):
+            dtypes[rule["src"]] = "float64"
+        for c in rule.get("numeric", []):
+            dtypes[c] = "float64"
+    return dtypes
+
+
+###cast the numeric input columns, the frame has to be read with dtype=object
+###cells that are no numbers (e.g. "n.a.") are left empty and reported with sheet, row and column
+###(row = row number in the sheet, the header being row 1)
+def apply_input_dtypes(df_in: pd.DataFrame, sheet_name: str = "") -> pd.DataFrame:
+    for c, dtype in input_dtypes().items():
+        if dtype != "float64" or c not in df_in.columns:
+            continue
+        values = pd.to_numeric(df_in[c], errors="coerce").astype("float64")
+        coerced = values.isna() & df_in[c].notna()
+        if coerced.any():
+            cells = ", ".join(f"row {i + 2} ({v!r})" for i, v in df_in[c][coerced].head(10).items())
+            more = f" and {coerced.sum() - 10} more" if coerced.sum() > 10 else ""
+            print(f"sheet {sheet_name}, column {c}: no number, left empty: {cells}{more}")
+        df_in[c] = values
+    return df_in
+
+
+###---compiled SPEC---###
+###SPEC is compiled once per input header into an immutable plan:
+###rule kinds are resolved, "src" columns are looked up to positions
+###and "ref" rules are ordered so that every target exists before it is copied
+class Plan(NamedTuple):
+    columns: tuple #output columns in SPEC order
+    steps: tuple #(out_col, kind, arg), kind in "fn", "src", "const", "na"
+    refs: tuple #(out_col, target), dependency ordered
+
+    def run(self, df_in: pd.DataFrame, sheet_name: str) -> pd.DataFrame:
+        values = {}
+        for out_col, kind, arg in self.steps:
+            if kind == "fn":
+                values[out_col] = arg(df_in, sheet_name=sheet_name)
+            elif kind == "src":
+                values[out_col] = df_in.iloc[:, arg]
+            elif kind == "const":
+                values[out_col] = arg
+            else:
+                values[out_col] = pd.NA
+        #"ref" columns are not materialized, see resolve_refs()
+        columns = self.physical_columns()
+
+        #build the frame in one go, constants are broadcast to the index,
+        #copy=False keeps the copied "src" columns as views of the input
+        return pd.DataFrame(
+            {c: values[c] for c in columns},
+            index=df_in.index, columns=columns, copy=False,
+        )
+
+    def physical_columns(self) -> list:
+        aliases = {out_col for out_col, _ in self.refs}
+        return [c for c in self.columns if c not in aliases]
+
+
+def compile_spec(spec: dict, columns) -> Plan:
+    positions = {c: i for i, c in reversed(list(enumerate(columns)))} #first match wins
+    steps = []
+    refs = {}
+    for out_col, rule in spec.items():
         if "fn" in rule:
-            out[out_col] = rule["fn"](df_in, sheet_name=sheet_name)
+            steps.append((out_col, "fn", rule["fn"]))
         elif "src" in rule:
-            src = rule["src"]
-            out[out_col] = df_in[src] if src in df_in.columns else pd.NA
+            pos = positions.get(rule["src"])
+            steps.append((out_col, "na", None) if pos is None else (out_col, "src", pos))
         elif "ref" in rule:
-            out[out_col] = out[rule["ref"]]
+            refs[out_col] = rule["ref"]
         elif "const" in rule:
-            out[out_col] = rule["const"]
+            steps.append((out_col, "const", rule["const"]))
+        else:
+            steps.append((out_col, "na", None))
+
+    #order the "ref" rules: a ref may point to another ref
+    ordered = []
+    resolved = {out_col for out_col, _, _ in steps}
+    while refs:
+        ready = [c for c, target in refs.items() if target in resolved]
+        if not ready:
+            raise ValueError(f"SPEC: unresolvable or cyclic \"ref\" rules: {refs}")
+        for c in ready:
+            ordered.append((c, refs.pop(c)))
+            resolved.add(c)
+    return Plan(tuple(spec), tuple(steps), tuple(ordered))
+
+
+@lru_cache(maxsize=64)
+def _plan_for(columns: tuple) -> Plan:
+    return compile_spec(SPEC, columns)
+
+
+###"ref" columns are lazy aliases: the transformed frame only holds their target,
+###the alias is added (without copying) when the rows are serialized
+def resolve_refs(df_out: pd.DataFrame) -> pd.DataFrame:
+    plan = _plan_for(())
+    values = {c: df_out[c] for c in df_out.columns}
+    for out_col, target in plan.refs:
+        if target in values:
+            values[out_col] = values[target]
+    columns = [c for c in plan.columns if c in values]
+    return pd.DataFrame(values, index=df_out.index, columns=columns, copy=False)
+
+
+###take the xlsx sheet and loop over the SPEC and apply rules -> association xlsx to odv
+###(the compiled plan is reused for all sheets and chunks with the same columns)
+###"ref" columns are left out, see resolve_refs()
+def transform_one_file(df_in: pd.DataFrame, sheet_name: str, plan: Plan = None) -> pd.DataFrame:
+    if plan is None:
+        plan = _plan_for(tuple(df_in.columns))
+    return plan.run(df_in, sheet_name)
+
+
+###open the workbook once and parse all sheets from the same handle
+###-> zip, shared strings and styles are only loaded a single time
+def read_workbook(xlsx_path: Path, sheet_names: list, usecols: list = None) -> dict:
+    if usecols is not None:
+        wanted = set(usecols)
+        usecols = lambda c: str(c).strip() in wanted
+    sheets = {}
+    with pd.ExcelFile(xlsx_path) as xls:
+        for name in sheet_names:
+            df_in = xls.parse(sheet_name=name, usecols=usecols, dtype=object)
+            df_in.columns = df_in.columns.str.strip() # remove space
+            sheets[name] = apply_input_dtypes(df_in, name)
+    return sheets
+
+
+###---Parquet cache of parsed sheets---###
+###key = workbook content hash + sheet name + reader options
+def workbook_hash(xlsx_path: Path) -> str:
+    h = hashlib.sha256()
+    with open(xlsx_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _cache_file(cache_dir: Path, digest: str, sheet_name: str, usecols: list) -> Path:
+    key = json.dumps([digest, sheet_name, usecols, input_dtypes()])
+    return cache_dir / (hashlib.sha256(key.encode("utf-8")).hexdigest() + ".parquet")
+
+
+###drop least recently used entries until the cache fits into max_bytes
+def evict_cache(cache_dir: Path, max_bytes: int) -> None:
+    entries = []
+    for f in cache_dir.glob("*.parquet"):
+        try:
+            st = f.stat()
+        except FileNotFoundError: #removed by a concurrent run
+            continue
+        entries.append((st.st_mtime, st.st_size, f))
+    total = sum(size for _, size, _ in entries)
+    for _, size, f in sorted(entries):
+        if total <= max_bytes:
+            break
+        f.unlink(missing_ok=True)
+        total -= size
+
+
+###like read_workbook, but parsed sheets are taken from / stored to the cache
+def read_workbook_cached(xlsx_path: Path, sheet_names: list, usecols: list,
+                         cache_dir: Path, max_bytes: int) -> dict:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    digest = workbook_hash(xlsx_path)
+    files = {name: _cache_file(cache_dir, digest, name, usecols) for name in sheet_names}
+
+    sheets = {}
+    for name, f in files.items():
+        if f.exists():
+            sheets[name] = _restore_object_columns(pd.read_parquet(f))
+            os.utime(f) #mark as recently used
+    missing = [name for name in sheet_names if name not in sheets]
+    if missing:
+        #only the sheets not in the cache are parsed, still in a single workbook load
+        for name, df_in in read_workbook(xlsx_path, missing, usecols=usecols).items():
+            sheets[name] = df_in
+            tmp = files[name].with_suffix(".tmp")
+            try:
+                df_in.to_parquet(tmp, index=False)
+            except (ValueError, TypeError) as err: #e.g. mixed types in a column
+                print(f"sheet {name} not cached: {err}")
+                tmp.unlink(missing_ok=True)
+                continue
+            os.replace(tmp, files[name])
+    evict_cache(cache_dir, max_bytes)
+    return {name: sheets[name] for name in sheet_names}
+
+
+###Parquet stores an object column of ints and missing values as float64
+###-> back to object with ints, as read_workbook has it
+def _restore_object_columns(df_in: pd.DataFrame) -> pd.DataFrame:
+    for c, dtype in input_dtypes().items():
+        if dtype == "object" and c in df_in.columns and pd.api.types.is_float_dtype(df_in[c]):
+            x = df_in[c].to_numpy()
+            values = x.astype(object)
+            whole = np.flatnonzero(np.isfinite(x) & (x == np.round(x)))
+            values[whole] = x[whole].astype("int64").tolist()
+            df_in[c] = values
+    return df_in
+
+
+###convert a text cell like the pandas openpyxl reader does (5.0 -> 5)
+def _convert_cell(value):
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+###streaming reader: iterate the sheet rows in chunks of fixed size
+###uses the read-only (SAX-style) openpyxl mode, i.e. rows are never all in memory
+###usecols: keep only these columns, the rows are only read from the first to the last of them
+###(openpyxl still has to scan every cell of the sheet xml, it just skips building the others)
+def iter_workbook_chunks(xlsx_path: Path, sheet_names: list, chunksize: int, usecols: list = None):
+    wanted = None if usecols is None else set(usecols)
+    wb = load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        for name in sheet_names:
+            ws = wb[name]
+            header = next(ws.iter_rows(max_row=1, values_only=True), ())
+            columns = [
+                f"Unnamed: {i}" if c is None else str(c).strip() # remove space
+                for i, c in enumerate(header)
+            ]
+            keep = [
+                i for i, c in enumerate(columns)
+                if wanted is None or c in wanted
+            ]
+            columns = [columns[i] for i in keep]
+            #bound the row tuples to the wanted columns, positions relative to the first of them
+            first, last = (keep[0], keep[-1]) if keep else (0, 0)
+            keep = [i - first for i in keep]
+            rows = ws.iter_rows(min_row=2, min_col=first + 1, max_col=last + 1, values_only=True)
+            #numeric columns are cast per chunk, only object columns need the cell conversion
+            dtypes = input_dtypes()
+            convert = [dtypes.get(c, "object") == "object" for c in columns]
+            start = 0
+            buf = []
+            for row in rows:
+                if all(v is None for v in row):
+                    continue
+                buf.append([
+                    None if i >= len(row) else _convert_cell(row[i]) if conv else row[i]
+                    for i, conv in zip(keep, convert)
+                ])
+                if len(buf) == chunksize:
+                    yield name, _chunk_frame(buf, columns, start, name)
+                    start += len(buf)
+                    buf = []
+            if buf:
+                yield name, _chunk_frame(buf, columns, start, name)
+    finally:
+        wb.close()
+
+
+def _chunk_frame(buf: list, columns: list, start: int, sheet_name: str = "") -> pd.DataFrame:
+    df = pd.DataFrame(buf, columns=columns, dtype=object)
+    df.index = pd.RangeIndex(start, start + len(df))
+    return apply_input_dtypes(df, sheet_name)
+
+
+###---ODV header generated from SPEC---###
+ODV_HEADER_TEMPLATE = """//<Encoding>UTF-8</Encoding>
+//<Version>ODV Spreadsheet V4.8</Version>
+//<Creator>smieruch@bgeo04l004</Creator>
+//<CreateTime>{create_time}</CreateTime>
+//<Software>Ocean Data View 5.8.3.4 - 64 bit (Linux)</Software>
+//<Source>/home/smieruch/Projects/Helgoland/Helgoland_OpenSea_Felswatt.odv</Source>
+//<SourceLastModified>2026-01-13T22:14:31</SourceLastModified>
+//<View>AllStationsMap</View>
+//<DataField>Ocean</DataField>
+//<DataType>TimeSeries</DataType>
+//<Description>Spreadsheet import data</Description>
+//
+"""
+_header_cache = {} #SPEC hash -> rendered header with a {create_time} placeholder
+
+
+def _header_fields(spec: dict) -> list:
+    return [
+        [out_col, rule.get("label", out_col), rule.get("meta"), rule.get("data")]
+        for out_col, rule in spec.items()
+    ]
+
+
+def spec_hash(spec: dict = SPEC) -> str:
+    return hashlib.sha256(json.dumps(_header_fields(spec), sort_keys=True).encode("utf-8")).hexdigest()
+
+
+###hash of a header text without its CreateTime line
+def header_hash(header_text: str) -> str:
+    lines = [line for line in header_text.splitlines() if not line.startswith("//<CreateTime>")]
+    return hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()
+
+
+def _variable_comment(var: dict) -> str:
+    comment = var.get("comment", "")
+    p01 = var.get("p01")
+    if p01:
+        link = f"https://vocab.nerc.ac.uk/collection/P01/current/{p01}/ Codes: SDN:P01::{p01}"
+        comment = f"{comment}, {link}" if comment else link
+    return comment
+
+
+def _render_static_header(spec: dict) -> str:
+    meta_lines = []
+    data_lines = []
+    for _, label, meta, data in _header_fields(spec):
+        if meta is not None:
+            meta_lines.append(
+                f'//<MetaVariable>label="{label}" var_type="{meta["var_type"]}" '
+                f'value_type="{meta["value_type"]}" qf_schema="{meta.get("qf_schema", "ODV")}" '
+                f'significant_digits="{meta.get("significant_digits", 0)}" '
+                f'comment="{_variable_comment(meta)}"</MetaVariable>'
+            )
+        elif data is not None:
+            data_lines.append(
+                f'//<DataVariable>label="{label}" value_type="{data["value_type"]}" '
+                f'qf_schema="{data.get("qf_schema", "SEADATANET")}" '
+                f'significant_digits="{data.get("significant_digits", 0)}" '
+                f'is_primary_variable="{data.get("is_primary_variable", "F")}" '
+                f'comment="{_variable_comment(data)}" key_variable="{data.get("key_variable", "")}"</DataVariable>'
+            )
+    labels = [label for _, label, _, _ in _header_fields(spec)]
+    return (
+        ODV_HEADER_TEMPLATE
+        + "\n".join(meta_lines) + "\n//\n"
+        + "\n".join(data_lines) + "\n//\n"
+        + "\t".join(labels) + "\n"
+    )
+
+
+###ODV header for SPEC, the static part is rendered once per SPEC hash,
+###only CreateTime is filled in per call
+def render_header(spec: dict = SPEC, create_time: dt.datetime = None) -> str:
+    key = spec_hash(spec)
+    if key not in _header_cache:
+        _header_cache[key] = _render_static_header(spec)
+    create_time = create_time or dt.datetime.now()
+    return _header_cache[key].replace("{create_time}", create_time.strftime("%Y-%m-%dT%H:%M:%S"), 1)
+
+
+###---ODV header model---###
+_VARIABLE_LINE = re.compile(r"^//<(MetaVariable|DataVariable)>(.*)</\1>\s*$")
+_ATTRIBUTE = re.compile(r'(\w+)="([^"]*)"')
+
+
+###parse the header into {label: attributes} of the Meta/DataVariables
+###and the list of column labels (the last, non-comment line)
+def parse_odv_header(header_text: str) -> tuple:
+    variables = {}
+    columns = []
+    for line in header_text.splitlines():
+        m = _VARIABLE_LINE.match(line)
+        if m:
+            attrs = dict(_ATTRIBUTE.findall(m.group(2)))
+            attrs["kind"] = m.group(1)
+            variables[attrs.get("label", "")] = attrs
+        elif line and not line.startswith("//"):
+            columns = line.split("\t")
+    return variables, columns
+
+
+###ODV column label of every output column
+def spec_labels(spec: dict = SPEC) -> dict:
+    return {out_col: rule.get("label", out_col) for out_col, rule in spec.items()}
+
+
+###decimals per output column from significant_digits of the header,
+###None = no rounding (text, QV flags, columns without variable)
+def column_digits(header_text: str) -> dict:
+    variables, _ = parse_odv_header(header_text)
+    digits = {}
+    for out_col, label in spec_labels().items():
+        var = variables.get(label, {})
+        value_type = var.get("value_type", "")
+        if value_type in ("FLOAT", "DOUBLE") and var.get("significant_digits", "").isdigit():
+            digits[out_col] = int(var["significant_digits"])
+        elif value_type in ("BYTE", "SHORT", "INTEGER"):
+            digits[out_col] = 0
+        else:
+            digits[out_col] = None
+    return digits
+
+
+###output columns holding ODV meta variables (Cruise, Station, Type, lon, lat)
+def meta_columns(header_text: str) -> list:
+    variables, _ = parse_odv_header(header_text)
+    return [
+        out_col for out_col, label in spec_labels().items()
+        if variables.get(label, {}).get("kind") == "MetaVariable"
+    ]
+
+
+###output columns that are empty in all frames, found with one notna().any() per frame
+###an empty "ref" target takes its aliases along, an empty variable its QV flags
+###meta variables (Cruise, Station, Type, lon, lat) and the date column are always kept,
+###ODV needs them to import the file
+def empty_columns(frames: list, header_text: str) -> list:
+    present = {}
+    for df_out in frames:
+        for c, has_values in df_out.notna().any().items():
+            present[c] = present.get(c, False) or bool(has_values)
+    keep = {*meta_columns(header_text), TIME_COLUMN}
+    empty = {c for c, has_values in present.items() if not has_values and c not in keep}
+
+    for out_col, target in _plan_for(()).refs:
+        if target in empty:
+            empty.add(out_col)
+    labels = spec_labels()
+    dropped = {labels[c] for c in empty}
+    for out_col, label in labels.items():
+        if label.startswith("QV:") and label.split(":", 2)[-1] in dropped:
+            empty.add(out_col)
+    return [c for c in SPEC if c in empty]
+
+
+###remove the variable lines and column labels of out_cols from the header
+def drop_header_columns(header_text: str, out_cols: list) -> str:
+    labels = spec_labels()
+    drop = {labels[c] for c in out_cols}
+    lines = []
+    for line in header_text.splitlines():
+        m = _VARIABLE_LINE.match(line)
+        if m and dict(_ATTRIBUTE.findall(m.group(2))).get("label") in drop:
+            continue
+        if line and not line.startswith("//"):
+            line = "\t".join(label for label in line.split("\t") if label not in drop)
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+###format one column to strings, numbers are rounded to "digits" decimals
+###(trailing zeros dropped), everything else is str() as in to_csv, missing -> ""
+def format_column(values: pd.Series, digits: int = None) -> np.ndarray:
+    if digits is not None and pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        x = np.round(values.to_numpy(dtype="float64", na_value=np.nan), digits) + 0.0 #no "-0"
+        if digits == 0:
+            return factorized_format(x, lambda u: [f"{v:.0f}" for v in u])
+        return factorized_format(x, lambda u: [f"{v:.{digits}f}".rstrip("0").rstrip(".") for v in u])
+    return factorized_format(values, lambda u: [str(v) for v in u])
+
+
+###SeaDataNet measurand qualifier flags (L20) used in the QV columns: flag -> meaning
+SDN_FLAGS = {
+    "0": "no_quality_control", "1": "good_value", "2": "probably_good_value", "3": "probably_bad_value",
+    "4": "bad_value", "5": "changed_value", "6": "value_below_detection", "7": "value_in_excess",
+    "8": "interpolated_value", "9": "missing_value", "A": "value_phenomenon_uncertain",
+    "B": "nominal_value", "Q": "value_below_limit_of_quantification",
+}
+
+
+###QV flags as strings ("2", "Q"), missing -> ""; fails on flags SeaDataNet does not define
+def flag_strings(values: pd.Series, label: str) -> np.ndarray:
+    flags = factorized_format(values, lambda u: [_flag_string(v) for v in u])
+    unknown = [f for f in pd.unique(flags) if f and f not in SDN_FLAGS]
+    if unknown:
+        raise ValueError(f"{label}: unknown quality flags {unknown}")
+    return flags
+
+
+def _flag_string(value) -> str:
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+###---compressed output---###
+###gzip in several threads: the data is cut into blocks which are compressed as
+###independent gzip members (a valid .gz file, readable by gzip/zcat/ODV tools)
+class ParallelGzipWriter:
+    def __init__(self, fileobj, level: int, threads: int, block_size: int = 4 * 1024 * 1024):
+        self._fh = fileobj
+        self._level = level
+        self._block_size = block_size
+        self._buf = bytearray()
+        self._pool = ThreadPoolExecutor(max_workers=threads)
+        self._pending = deque()
+        self._max_pending = 2 * threads
+
+    def write(self, data: bytes) -> int:
+        self._buf += data
+        while len(self._buf) >= self._block_size:
+            self._submit(bytes(self._buf[:self._block_size]))
+            del self._buf[:self._block_size]
+        return len(data)
+
+    def _submit(self, block: bytes) -> None:
+        #zlib releases the GIL -> the blocks are compressed in parallel, written in order
+        self._pending.append(self._pool.submit(gzip.compress, block, self._level, mtime=0))
+        while len(self._pending) > self._max_pending:
+            self._fh.write(self._pending.popleft().result())
+
+    def close(self) -> None:
+        if self._buf:
+            self._submit(bytes(self._buf))
+            self._buf.clear()
+        while self._pending:
+            self._fh.write(self._pending.popleft().result())
+        self._pool.shutdown()
+
+
+###compressing stream on top of the binary file object, codec chosen by suffix (.gz, .zst)
+###level None = default level of the codec; closing the stream leaves fileobj open
+def open_output(fileobj, suffix: str, level: int = None, threads: int = 1, buffer_size: int = WRITE_BUFFER):
+    suffix = suffix.lower()
+    if suffix == ".gz":
+        level = 6 if level is None else level
+        if threads > 1:
+            return ParallelGzipWriter(fileobj, level, threads)
+        #mtime=0 -> same input gives the same bytes
+        return io.BufferedWriter(gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=level, mtime=0), buffer_size)
+    if suffix == ".zst":
+        cctx = _zstandard().ZstdCompressor(level=3 if level is None else level, threads=threads if threads > 1 else 0)
+        return cctx.stream_writer(fileobj, closefd=False)
+    return fileobj
+
+
+###binary (decompressed) input stream of an ODV file written by OdvWriter
+def open_input(path: Path):
+    suffix = path.suffix.lower()
+    if suffix == ".gz":
+        return gzip.open(path, "rb")
+    if suffix == ".zst":
+        return io.BufferedReader(_zstandard().ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+    return open(path, "rb")
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(".zst files need the zstandard package") from None
+    return zstandard
+
+
+###---atomic output---###
+_CREATE_TIME = b"//<CreateTime>"
+
+
+###hash of the (decompressed) ODV content without the CreateTime line,
+###i.e. two files with equal hash only differ in when they were written
+def odv_content_hash(path: Path) -> str:
+    return _content_hasher(path).hexdigest()
+
+
+###sha256 object fed with the content of path, can be updated further (appending)
+def _content_hasher(path: Path):
+    h = hashlib.sha256()
+    with open_input(path) as f:
+        for line in f:
+            if not line.startswith(_CREATE_TIME):
+                h.update(line)
+            if not line.startswith(b"//"): #column line -> end of header
+                break
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h
+
+
+def _fsync_dir(path: Path) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError: #e.g. not supported on Windows
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+###---sidecar index---###
+###<outfile>.idx.json: one block per run of rows with the same (station, year), in file order
+###block: offset/end (bytes, end exclusive), rows, zones {output column: [min, max]} of the
+###numeric variables as written; offsets of *.gz / *.zst files count decompressed bytes
+###in compact files the first row of every block carries the full meta values
+###file_size and digest (odv_content_hash) tie the index to the content it was written for
+def index_file(outfile: Path) -> Path:
+    return outfile.with_name(outfile.name + ".idx.json")
+
+
+###None if there is no index or outfile was changed after the index was written:
+###size and content hash (odv_content_hash, without CreateTime) have to match the index
+###digest: content hash of outfile if already known, else outfile is read to compute it
+def load_index(outfile: Path, digest: str = None) -> dict:
+    try:
+        index = json.loads(index_file(outfile).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+    if not outfile.exists() or index.get("file_size") != outfile.stat().st_size:
+        return None
+    if index.get("digest") != (digest or odv_content_hash(outfile)):
+        return None
+    return index
+
+
+def save_index(outfile: Path, index: dict) -> None:
+    path = index_file(outfile)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(index, indent=1), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+###---reading ODV files---###
+###the header lines up to and including the column labels of an ODV file (also *.gz / *.zst)
+def read_odv_header(path: Path) -> str:
+    with open_input(path) as f:
+        return _read_header(f)
+
+
+def _read_header(f) -> str:
+    lines = []
+    for line in f:
+        lines.append(line.decode("utf-8"))
+        if not line.startswith(b"//"): #column line -> end of header
+            break
+    return "".join(lines)
+
+
+###pandas dtype per column label from value_type of the header:
+###FLOAT -> float32, DOUBLE -> float64, BYTE/SHORT/INTEGER -> nullable ints,
+###INDEXED_TEXT -> category, everything else (TEXT:n, QV flags, date/ISO time columns) -> string
+_ODV_DTYPES = {"FLOAT": "float32", "DOUBLE": "float64", "BYTE": "Int8", "SHORT": "Int16", "INTEGER": "Int32",
+               "INDEXED_TEXT": "category"}
+
+
+def odv_dtypes(header_text: str) -> dict:
+    variables, columns = parse_odv_header(header_text)
+    dtypes = {}
+    for label in columns:
+        value_type = variables.get(label, {}).get("value_type", "")
+        if label.startswith("time_ISO8601"): #ISO strings, although declared DOUBLE
+            value_type = ""
+        dtypes[label] = _ODV_DTYPES.get(value_type, "string")
+    return dtypes
+
+
+###read the data rows of an ODV file into a frame with the column labels of the header
+###usecols: only these column labels; chunksize: iterator of frames with chunksize rows
+###fill_meta: empty meta fields (compact files) get the value of the row before, as in ODV
+def read_odv(path: Path, usecols: list = None, chunksize: int = None, fill_meta: bool = True):
+    chunks = _read_odv_chunks(path, usecols, chunksize, fill_meta)
+    if chunksize:
+        return chunks
+    (df_odv,) = chunks
+    return df_odv
+
+
+def _read_odv_chunks(path: Path, usecols: list, chunksize: int, fill_meta: bool):
+    with open_input(path) as f:
+        header_text = _read_header(f)
+        variables, columns = parse_odv_header(header_text)
+        dtypes = odv_dtypes(header_text)
+        if usecols is not None:
+            missing = [c for c in usecols if c not in dtypes]
+            if missing:
+                raise ValueError(f"{path} has no columns {missing}")
+            dtypes = {c: dtypes[c] for c in columns if c in usecols}
+        meta = [c for c in dtypes if variables.get(c, {}).get("kind") == "MetaVariable"] if fill_meta else []
+        reader = pd.read_csv(
+            f, sep="\t", header=None, names=columns, usecols=list(dtypes), dtype=dtypes,
+            keep_default_na=False, na_values=[""], quoting=3, #QUOTE_NONE: ODV has no quoting
+            chunksize=chunksize or None,
+        )
+        last = {} #meta values of the last row, carried into the next chunk
+        for df in (reader if chunksize else [reader]):
+            for c in (meta if len(df) else []):
+                values = df[c]
+                if c in last and pd.isna(values.iloc[0]):
+                    if isinstance(values.dtype, pd.CategoricalDtype) and last[c] not in values.cat.categories:
+                        values = values.cat.add_categories([last[c]])
+                    values = values.copy()
+                    values.iloc[0] = last[c]
+                values = values.ffill()
+                df[c] = values
+                if pd.notna(values.iloc[-1]):
+                    last[c] = values.iloc[-1]
+            yield df
+
+
+###streaming ODV writer: the output is opened once with a large buffer,
+###the header is written first, then the data rows of every sheet/chunk as they come
+###rows are serialized column-wise at the precision given in the header and written as bytes
+###outfile *.gz / *.zst is compressed on the fly
+###compact=True sorts every frame written (a sheet, or a chunk with --chunksize) by station and time
+###and writes meta values only where they change; frames are not sorted against each other,
+###i.e. the stations stay in sheet order and are time ordered if their sheet/chunks are
+###the data goes to a temp file which replaces outfile on close (after fsync), unless the
+###content is unchanged -> outfile is never half written and only touched on real changes
+###append=True adds rows to the end of an existing outfile (no header, no temp file),
+###on failure the file is truncated back to its old size
+###index=True writes the sidecar index (see index_file) next to outfile
+class OdvWriter:
+    def __init__(self, outfile: Path, header_text: str, buffer_size: int = WRITE_BUFFER,
+                 compress_level: int = None, compress_threads: int = 1, compact: bool = False,
+                 append: bool = False, index: bool = False):
+        self.outfile = outfile
+        self.changed = None #set on close: False if outfile already had this content
+        self._digits = column_digits(header_text)
+        self._compact = meta_columns(header_text) if compact else []
+        self._last_meta = {} #meta values of the last row written, for compaction
+        self._hash = hashlib.sha256()
+        self._offset = 0 #uncompressed bytes written so far
+        self._index = [] if index else None #blocks of the sidecar index
+
+        if append:
+            self._tmp = None
+            self._append_at = outfile.stat().st_size
+            if index:
+                #digest of the whole file after appending -> continue from the existing content
+                self._hash = _content_hasher(outfile)
+                previous = load_index(outfile, self._hash.hexdigest())
+                if previous is not None:
+                    self._index = previous["blocks"]
+                    self._offset = previous["size"]
+                else:
+                    print(f"no up-to-date index for {outfile}, appending without index")
+                    self._index = None
+            self._raw = open(outfile, "ab", buffering=buffer_size)
+            self._fh = open_output(self._raw, outfile.suffix, compress_level, compress_threads, buffer_size)
+            return
+        fd, tmp = tempfile.mkstemp(dir=outfile.parent, prefix=f".{outfile.name}.", suffix=".tmp")
+        self._tmp = Path(tmp)
+        self._raw = os.fdopen(fd, "wb", buffering=buffer_size)
+        self._fh = open_output(self._raw, outfile.suffix, compress_level, compress_threads, buffer_size)
+
+        header = (header_text.rstrip("\n") + "\n").encode("utf-8")
+        self._fh.write(header)
+        self._offset = len(header)
+        for line in header.splitlines(keepends=True):
+            if not line.startswith(_CREATE_TIME):
+                self._hash.update(line)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
         else:
-            out[out_col] = pd.NA
-    return out
+            self.abort()
+
+    def write(self, df_out: pd.DataFrame) -> None:
+        if self._compact:
+            df_out = df_out.sort_values([STATION_COLUMN, TIME_COLUMN], kind="stable")
+        #"ref" aliases are resolved per slice -> only WRITE_ROWS rows are duplicated at a time
+        for start in range(0, len(df_out), WRITE_ROWS):
+            self._write_slice(resolve_refs(df_out.iloc[start:start + WRITE_ROWS]))
+
+    def _write_slice(self, df_out: pd.DataFrame) -> None:
+        cells = [format_column(df_out[c], self._digits.get(c)) for c in df_out.columns]
+        if self._index is None:
+            runs, starts = [(0, len(df_out))], None
+        else:
+            runs, starts = self._block_runs(df_out)
+        for i, c in enumerate(df_out.columns):
+            if c in self._compact:
+                cells[i] = self._compact_meta(c, cells[i], starts)
+        if self._index is None:
+            self._emit(("\n".join(map("\t".join, zip(*cells))) + "\n").encode("utf-8"))
+            return
+        #one encode per block to get its byte length
+        rows = list(map("\t".join, zip(*cells)))
+        zones = self._zone_values(df_out)
+        for a, b in runs:
+            offset = self._offset
+            self._emit(("\n".join(rows[a:b]) + "\n").encode("utf-8"))
+            self._add_block(df_out, a, b, offset, zones)
+
+    #ODV data lines (bytes, with newline) that are already formatted, e.g. merged from other files
+    def write_lines(self, lines) -> None:
+        if self._index is not None:
+            raise ValueError("the sidecar index is only built from frames (write)")
+        lines = iter(lines)
+        for batch in iter(lambda: list(islice(lines, WRITE_ROWS)), []):
+            self._emit(b"".join(batch))
+
+    def _emit(self, data: bytes) -> None:
+        self._fh.write(data)
+        self._hash.update(data)
+        self._offset += len(data)
+
+    #compact mode: a meta value is only written where it differs from the row before,
+    #ODV carries empty meta fields over from the previous row of the station
+    #starts: rows opening an index block, these get the full meta values so a reader
+    #seeking to the block does not need the rows before it
+    def _compact_meta(self, column: str, cells: np.ndarray, starts: np.ndarray = None) -> np.ndarray:
+        if len(cells) == 0:
+            return cells
+        previous = np.empty(len(cells), dtype=object)
+        previous[0] = self._last_meta.get(column)
+        previous[1:] = cells[:-1]
+        self._last_meta[column] = cells[-1]
+        same = cells == previous
+        if starts is not None:
+            same &= ~starts
+        return np.where(same, "", cells)
+
+    #---sidecar index---
+    #runs of consecutive rows with the same (station, year) as (first, end) row positions;
+    #starts marks the first row of every block (not a run continuing the last block written)
+    def _block_runs(self, df_out: pd.DataFrame) -> tuple:
+        station = df_out[STATION_COLUMN].astype(str).to_numpy(dtype=object)
+        year = df_out[TIME_COLUMN].astype(str).str[:4].to_numpy(dtype=object)
+        bounds = np.flatnonzero((station[1:] != station[:-1]) | (year[1:] != year[:-1])) + 1
+        edges = [0, *bounds.tolist(), len(df_out)]
+        runs = list(zip(edges[:-1], edges[1:]))
+        starts = np.zeros(len(df_out), dtype=bool)
+        starts[edges[:-1]] = True
+        if len(df_out) and self._index:
+            last = self._index[-1]
+            if [last["station"], last["year"]] == [station[0], year[0]] and last["end"] == self._offset:
+                starts[0] = False
+        return runs, starts
+
+    #numeric variables rounded as written -> zone maps match the values in the file
+    def _zone_values(self, df_out: pd.DataFrame) -> dict:
+        zones = {}
+        for c in df_out.columns:
+            digits = self._digits.get(c)
+            if digits is None or not pd.api.types.is_numeric_dtype(df_out[c]):
+                continue
+            zones[c] = np.round(df_out[c].to_numpy(dtype="float64", na_value=np.nan), digits)
+        return zones
+
+    def _add_block(self, df_out: pd.DataFrame, a: int, b: int, offset: int, zones: dict) -> None:
+        station = str(df_out[STATION_COLUMN].iloc[a])
+        year = str(df_out[TIME_COLUMN].iloc[a])[:4]
+        last = self._index[-1] if self._index else {}
+        if [last.get("station"), last.get("year")] == [station, year] and last.get("end") == offset:
+            block = last #run continues the block of the previous slice
+        else:
+            block = {"station": station, "year": year, "offset": offset, "end": offset, "rows": 0, "zones": {}}
+            self._index.append(block)
+        block["end"] = self._offset
+        block["rows"] += b - a
+        for c, values in zones.items():
+            part = values[a:b]
+            part = part[~np.isnan(part)]
+            if len(part) == 0:
+                continue
+            low, high = float(part.min()), float(part.max())
+            if c in block["zones"]:
+                low = min(low, block["zones"][c][0])
+                high = max(high, block["zones"][c][1])
+            block["zones"][c] = [low, high]
+
+    def close(self) -> None:
+        self._close_tmp()
+        if self._tmp is None: #appended in place
+            self.changed = True
+            self._save_index()
+            return
+        if self.outfile.exists() and odv_content_hash(self.outfile) == self._hash.hexdigest():
+            self._tmp.unlink()
+            self.changed = False
+            #same content -> an existing index stays valid
+            if self._index is not None and load_index(self.outfile, self._hash.hexdigest()) is None:
+                self._save_index()
+            return
+        if self.outfile.exists():
+            shutil.copymode(self.outfile, self._tmp)
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(self._tmp, 0o666 & ~umask)
+        os.replace(self._tmp, self.outfile)
+        _fsync_dir(self.outfile.parent)
+        self.changed = True
+        self._save_index()
+
+    #without index=True an index of the old content is removed, it would no longer match
+    def _save_index(self) -> None:
+        if self._index is None:
+            index_file(self.outfile).unlink(missing_ok=True)
+            return
+        save_index(self.outfile, {
+            "file": self.outfile.name,
+            "file_size": self.outfile.stat().st_size,
+            "digest": self._hash.hexdigest(),
+            "size": self._offset,
+            "offsets": "uncompressed" if self.outfile.suffix in (".gz", ".zst") else "file",
+            "blocks": self._index,
+        })
+
+    #discard everything written, outfile stays as it was
+    def abort(self) -> None:
+        try:
+            self._close_tmp()
+        finally:
+            if self._tmp is None:
+                os.truncate(self.outfile, self._append_at)
+            else:
+                self._tmp.unlink(missing_ok=True)
+
+    def _close_tmp(self) -> None:
+        if self._fh is not self._raw:
+            self._fh.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._raw.close()
+
+
+###---NetCDF output---###
+###CF timeSeries (indexed ragged array): one entry per station in the "station" dimension,
+###the observations of all stations along "obs" with station_index pointing to their station
+###variable attributes (long_name, units, P01 code, comment) come from SPEC
+class NetcdfWriter:
+    def __init__(self, path: Path, chunksize: int = NETCDF_CHUNK, complevel: int = 4):
+        try:
+            import netCDF4
+        except ImportError:
+            raise ImportError("NetCDF output needs the netCDF4 package") from None
+        self.path = path
+        self._tmp = path.with_name(path.name + ".tmp")
+        self._chunksize = chunksize
+        self._complevel = complevel
+        self._stations = {} #station name -> index
+        self._vars = None #output column -> (netcdf variable, kind)
+        self._nc = netCDF4.Dataset(self._tmp, "w", format="NETCDF4")
+        nc = self._nc
+        nc.Conventions = "CF-1.8"
+        nc.featureType = "timeSeries"
+        nc.title = CRUISE_NAME
+        nc.source = f"{INPUT_XLSX.name}, converted by OpenSeaData2ODV.py"
+        nc.createDimension("station", None)
+        nc.createDimension("obs", None)
+
+        name = nc.createVariable("station_name", str, ("station",))
+        name.long_name = "station name"
+        name.cf_role = "timeseries_id"
+        for axis, units in (("lon", "degrees_east"), ("lat", "degrees_north")):
+            v = nc.createVariable(axis, "f8", ("station",), fill_value=np.nan)
+            v.standard_name = "longitude" if axis == "lon" else "latitude"
+            v.units = units
+        index = nc.createVariable("station_index", "i4", ("obs",), **self._compression(np.int32))
+        index.long_name = "which station this obs is for"
+        index.instance_dimension = "station"
+        time = nc.createVariable("time", "f8", ("obs",), **self._compression(np.float64))
+        time.standard_name = "time"
+        time.units = "seconds since 1970-01-01 00:00:00"
+        time.calendar = "standard"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _compression(self, dtype) -> dict:
+        options = {"zlib": True, "complevel": self._complevel, "chunksizes": (self._chunksize,)}
+        if dtype is not str:
+            options["shuffle"] = True
+        return options
+
+    #data variables of SPEC present in the frame, QV flags as ancillary variables
+    def _define_variables(self, columns) -> None:
+        labels = spec_labels()
+        self._vars = {}
+        names = {}
+        for out_col in columns:
+            data = SPEC.get(out_col, {}).get("data")
+            if data is None or out_col == "time_ISO8601":
+                continue
+            label = labels[out_col]
+            value_type = data["value_type"]
+            dtype = {"FLOAT": "f4", "DOUBLE": "f8"}.get(value_type, str)
+            fill = {} if dtype is str else {"fill_value": np.nan}
+            var = self._nc.createVariable(
+                netcdf_name(label), dtype, ("obs",), **fill, **self._compression(dtype),
+            )
+            var.long_name = label
+            units = re.search(r"\[(.*)\]", label)
+            if units:
+                var.units = ODV_UNITS.get(units.group(1), units.group(1))
+            if data.get("p01"):
+                var.sdn_parameter_urn = f"SDN:P01::{data['p01']}"
+            if data.get("comment"):
+                var.comment = data["comment"]
+            var.coordinates = "time lat lon"
+            self._vars[out_col] = (var, "text" if dtype is str else "number")
+            names[label] = var
+        for out_col in columns:
+            label = labels.get(out_col, out_col)
+            parent = names.get(label.split(":", 2)[-1]) if label.startswith("QV:") else None
+            if parent is None:
+                continue
+            var = self._nc.createVariable(
+                parent.name + "_qc", "i1", ("obs",), fill_value=np.int8(-1), **self._compression(np.int8),
+            )
+            var.long_name = f"{parent.long_name} quality flag"
+            var.conventions = "SeaDataNet measurand qualifier flags, A/B/Q stored as 10/11/12"
+            var.flag_values = np.arange(len(SDN_FLAGS), dtype=np.int8)
+            var.flag_meanings = " ".join(SDN_FLAGS.values())
+            parent.ancillary_variables = var.name
+            self._vars[out_col] = (var, "flag")
+
+    def write(self, df_out: pd.DataFrame) -> None:
+        if len(df_out) == 0:
+            return
+        if self._vars is None:
+            self._define_variables(df_out.columns)
+        nc = self._nc
+        start = len(nc.dimensions["obs"])
+        stop = start + len(df_out)
+
+        stations = df_out[STATION_COLUMN].astype(str)
+        for name, rows in df_out.groupby(stations, sort=False):
+            if name not in self._stations:
+                i = self._stations[name] = len(self._stations)
+                nc["station_name"][i] = name
+                for axis, out_col in (("lon", "xlon"), ("lat", "xlat")):
+                    values = pd.to_numeric(rows[out_col], errors="coerce").dropna() if out_col in rows else []
+                    nc[axis][i] = values.iloc[0] if len(values) else np.nan
+        nc["station_index"][start:stop] = stations.map(self._stations).to_numpy(dtype=np.int32)
+        times = pd.to_datetime(df_out[TIME_COLUMN], format="ISO8601")
+        nc["time"][start:stop] = (times - pd.Timestamp("1970-01-01")).dt.total_seconds().to_numpy()
+
+        for out_col, (var, kind) in self._vars.items():
+            if out_col not in df_out:
+                continue
+            values = df_out[out_col]
+            if kind == "text":
+                var[start:stop] = format_column(values)
+            elif kind == "flag":
+                flags = flag_strings(values, out_col)
+                var[start:stop] = pd.Series(flags).map(_FLAG_CODES).fillna(-1).to_numpy(dtype=np.int8)
+            else:
+                var[start:stop] = pd.to_numeric(values, errors="coerce").to_numpy(dtype=var.dtype, na_value=np.nan)
+
+    def close(self) -> None:
+        self._nc.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self) -> None:
+        self._nc.close()
+        self._tmp.unlink(missing_ok=True)
+
+
+###flag -> code of the NetCDF flag variables ("" = missing -> fill value -1)
+_FLAG_CODES = {flag: i for i, flag in enumerate(SDN_FLAGS)}
+
+
+###ODV label -> NetCDF variable name, e.g. "Temperature Sea [~^o~#C]" -> "Temperature_Sea"
+def netcdf_name(label: str) -> str:
+    name = re.sub(r"\W+", "_", re.sub(r"\[.*\]", "", label)).strip("_")
+    return name if name[:1].isalpha() else "v_" + name
+
+
+###ODV unit markup -> udunits
+ODV_UNITS = {"~^o~#C": "degree_Celsius", "m/s": "m s-1"}
+
+
+###---Parquet dataset output---###
+###hive partitioned dataset root/Station=.../year=.../part-*.parquet with typed columns:
+###FLOAT -> float32, DOUBLE -> float64, text and meta variables -> categorical,
+###QV flags -> categorical strings ("2", "Q", see SDN_FLAGS),
+###the ODV date column becomes a timestamp column "time"
+class ParquetDatasetWriter:
+    def __init__(self, root: Path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Parquet output needs the pyarrow package") from None
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.root = root
+        self._tmp = root.with_name(root.name + ".tmp")
+        shutil.rmtree(self._tmp, ignore_errors=True)
+        self._schema = None
+        self._parts = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _arrow_type(self, out_col: str):
+        pa = self._pa
+        rule = SPEC.get(out_col, {})
+        var = rule.get("meta") or rule.get("data")
+        if out_col == STATION_COLUMN:
+            return pa.dictionary(pa.int32(), pa.string())
+        if var is None:
+            if spec_labels().get(out_col, "").startswith("QV:"):
+                return pa.dictionary(pa.int8(), pa.string())
+            return pa.string()
+        value_type = var["value_type"]
+        if value_type == "FLOAT":
+            return pa.float32()
+        if value_type == "DOUBLE":
+            return pa.float64()
+        if value_type in ("BYTE", "SHORT", "INTEGER"):
+            return pa.int32()
+        return pa.dictionary(pa.int32(), pa.string())
+
+    def _typed_table(self, df_out: pd.DataFrame):
+        pa = self._pa
+        labels = spec_labels()
+        columns = {}
+        fields = []
+        times = pd.to_datetime(df_out[TIME_COLUMN], format="ISO8601")
+        columns["time"] = times
+        fields.append(pa.field("time", pa.timestamp("ms")))
+        for out_col in df_out.columns:
+            if out_col == TIME_COLUMN:
+                continue
+            arrow_type = self._arrow_type(out_col)
+            values = df_out[out_col]
+            if labels.get(out_col, "").startswith("QV:"):
+                values = pd.Series(flag_strings(values, out_col), index=df_out.index).replace("", None).astype("string")
+            elif pa.types.is_dictionary(arrow_type) or pa.types.is_string(arrow_type):
+                values = values.astype("string")
+            elif not pa.types.is_timestamp(arrow_type):
+                values = pd.to_numeric(values, errors="coerce")
+            columns[labels.get(out_col, out_col)] = values
+            fields.append(pa.field(labels.get(out_col, out_col), arrow_type))
+        columns["year"] = times.dt.year.astype("Int32")
+        fields.append(pa.field("year", pa.int32()))
+        frame = pd.DataFrame(columns, index=df_out.index)
+        return pa.Table.from_pandas(frame, preserve_index=False).cast(pa.schema(fields))
+
+    def write(self, df_out: pd.DataFrame) -> None:
+        if len(df_out) == 0:
+            return
+        table = self._typed_table(df_out)
+        self._pq.write_to_dataset(
+            table, self._tmp, partition_cols=[spec_labels()[STATION_COLUMN], "year"],
+            basename_template=f"part-{self._parts}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        self._parts += 1
+
+    #the finished dataset replaces the old one
+    def close(self) -> None:
+        self._tmp.mkdir(parents=True, exist_ok=True)
+        old = self.root.with_name(self.root.name + ".old")
+        if self.root.exists():
+            os.replace(self.root, old)
+        os.replace(self._tmp, self.root)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def abort(self) -> None:
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+
+###---SQLite output---###
+###table "odv" with one row per station and time, (Station, time) is the unique key:
+###rows are bulk loaded with executemany in one transaction, an existing row is only
+###updated if one of its values changed -> repeated/incremental runs touch changed rows only
+###rows of one load with the same key (e.g. date-only rows of the same day) overwrite each other,
+###the keys are counted in a temp table and the overwritten rows are reported on close
+class SqliteWriter:
+    def __init__(self, path: Path, table: str = "odv", batch_size: int = DB_BATCH):
+        self.path = path
+        self.table = table
+        self._batch_size = batch_size
+        self._columns = None #output column -> (SQL column, SQL type)
+        self._insert = None
+        self.rows = 0
+        self.changes = 0
+        self.overwritten = 0 #rows of this load replaced by a later row with the same key
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("BEGIN")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _sql_type(self, out_col: str) -> str:
+        rule = SPEC.get(out_col, {})
+        var = rule.get("meta") or rule.get("data")
+        if var is None: #incl. QV flags, they may be letters (see SDN_FLAGS)
+            return "TEXT"
+        if var["value_type"] in ("FLOAT", "DOUBLE"):
+            return "REAL"
+        if var["value_type"] in ("BYTE", "SHORT", "INTEGER"):
+            return "INTEGER"
+        return "TEXT"
+
+    def _define_table(self, columns) -> None:
+        labels = spec_labels()
+        self._columns = {
+            out_col: ("time" if out_col == TIME_COLUMN else labels.get(out_col, out_col), self._sql_type(out_col))
+            for out_col in columns
+        }
+        station = self._columns[STATION_COLUMN][0]
+        names = [name for name, _ in self._columns.values()]
+        definitions = ", ".join(f'"{name}" {sql_type}' for name, sql_type in self._columns.values())
+        self._db.execute(f'CREATE TABLE IF NOT EXISTS "{self.table}" ({definitions})')
+        #columns added to SPEC since the table was created
+        existing = {row[1] for row in self._db.execute(f'PRAGMA table_info("{self.table}")')}
+        for name, sql_type in self._columns.values():
+            if name not in existing:
+                self._db.execute(f'ALTER TABLE "{self.table}" ADD COLUMN "{name}" {sql_type}')
+        self._db.execute(
+            f'CREATE UNIQUE INDEX IF NOT EXISTS "{self.table}_station_time" '
+            f'ON "{self.table}" ("{station}", "time")'
+        )
+        self._db.execute('CREATE TEMP TABLE "load_keys" ("station", "time")')
+        self._key = itemgetter(list(self._columns).index(STATION_COLUMN), list(self._columns).index(TIME_COLUMN))
+        others = [name for name in names if name not in (station, "time")]
+        self._insert = (
+            f'INSERT INTO "{self.table}" ({", ".join(f"{chr(34)}{n}{chr(34)}" for n in names)}) '
+            f'VALUES ({", ".join("?" * len(names))}) '
+            f'ON CONFLICT ("{station}", "time") DO UPDATE SET '
+            + ", ".join(f'"{n}" = excluded."{n}"' for n in others)
+            + " WHERE "
+            + " OR ".join(f'"{n}" IS NOT excluded."{n}"' for n in others)
+        )
+
+    def write(self, df_out: pd.DataFrame) -> None:
+        if len(df_out) == 0:
+            return
+        if self._columns is None:
+            self._define_table(df_out.columns)
+        values = {}
+        for out_col, (_, sql_type) in self._columns.items():
+            column = df_out[out_col] if out_col in df_out else pd.Series(pd.NA, index=df_out.index)
+            if spec_labels().get(out_col, "").startswith("QV:") and out_col in df_out:
+                column = pd.Series(flag_strings(column, out_col), index=df_out.index).replace("", None)
+            elif sql_type == "TEXT":
+                column = column.astype(object)
+            else:
+                column = pd.to_numeric(column, errors="coerce").astype(object)
+            values[out_col] = column.where(column.notna(), None)
+        rows = zip(*(values[c] for c in self._columns))
+        while True:
+            batch = list(islice(rows, self._batch_size))
+            if not batch:
+                break
+            before = self._db.total_changes
+            self._db.executemany(self._insert, batch)
+            self.changes += self._db.total_changes - before #rows inserted or updated
+            self._db.executemany('INSERT INTO "load_keys" VALUES (?, ?)', map(self._key, batch))
+            self.rows += len(batch)
+
+    def close(self) -> None:
+        keys, self.overwritten = self._db.execute(
+            'SELECT COUNT(*), COALESCE(SUM(n - 1), 0) FROM '
+            '(SELECT COUNT(*) AS n FROM "load_keys" WHERE "station" IS NOT NULL AND "time" IS NOT NULL '
+            'GROUP BY "station", "time" HAVING n > 1)'
+        ).fetchone() if self._columns is not None else (0, 0)
+        self._db.execute("COMMIT")
+        self._db.close()
+        print(f"{self.path}: {self.changes} of {self.rows} rows inserted or updated")
+        if self.overwritten:
+            print(
+                f"{self.path}: {keys} (Station, time) keys occur in several rows, "
+                f"{self.overwritten} rows were overwritten by a later row with the same key"
+            )
+
+    def abort(self) -> None:
+        self._db.execute("ROLLBACK")
+        self._db.close()
+
+
+###---split output---###
+###one ODV file per station (or station and year), all with the same header,
+###e.g. Helgoland_OpenSea.txt -> Helgoland_OpenSea_Abiotics_Sea.txt / ..._Abiotics_Sea_2024.txt
+def split_outfile(outfile: Path, part: str) -> Path:
+    stem, dot, suffixes = outfile.name.partition(".")
+    part = re.sub(r"[^\w.-]+", "_", part)
+    return outfile.with_name(f"{stem}_{part}{dot}{suffixes}")
+
+
+def _split_keys(df_out: pd.DataFrame, by_year: bool) -> pd.Series:
+    if by_year:
+        return df_out[STATION_COLUMN].astype(str) + " " + df_out[TIME_COLUMN].astype(str).str[:4]
+    return df_out[STATION_COLUMN].astype(str)
+
+
+###the files are written in parallel threads, the writes to one file keep their order
+def write_split(frames, outfile: Path, header_text: str, by_year: bool = False,
+                threads: int = WRITE_THREADS, **writer_options) -> list:
+    writers = {}
+    pending = {} #part -> future of the last write to that file
+    in_flight = deque() #all submitted writes, at most 2 * threads -> the reader cannot run far ahead
+
+    def write_after(previous, writer, df_part):
+        if previous is not None:
+            previous.result()
+        writer.write(df_part)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        try:
+            for df_out in frames:
+                for part, df_part in df_out.groupby(_split_keys(df_out, by_year), sort=False):
+                    if part not in writers:
+                        writers[part] = OdvWriter(split_outfile(outfile, part), header_text, **writer_options)
+                    pending[part] = pool.submit(write_after, pending.get(part), writers[part], df_part)
+                    in_flight.append(pending[part])
+                    while len(in_flight) > 2 * threads:
+                        in_flight.popleft().result()
+            for future in pending.values():
+                future.result()
+        except BaseException:
+            for future in pending.values():
+                future.cancel()
+            pool.shutdown(wait=True)
+            for writer in writers.values():
+                writer.abort()
+            raise
+        list(pool.map(OdvWriter.close, writers.values()))
+    return list(writers.values())
+
+
+###---merging ODV files---###
+###merge of ODV files as the converter writes them (e.g. outputs of --split, of --incremental
+###appends or of conversions on other machines): the inputs are cut into blocks, i.e. runs of
+###lines of one station ordered by time; the output has one block per station (in order of first
+###appearance) with the blocks of all inputs merged by time (heap k-way merge),
+###rows with equal time keep the input order
+###a first pass finds the byte range of every block, the second streams the blocks
+###-> only the current line of every block is held in memory
+def merge_odv(paths: list, outfile: Path, **writer_options) -> "OdvWriter":
+    header_text = check_headers(paths)
+    create_time = dt.datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+    header_text = re.sub(r"^//<CreateTime>.*$", f"//<CreateTime>{create_time}</CreateTime>", header_text,
+                         count=1, flags=re.M)
+    variables, columns = parse_odv_header(header_text)
+    labels = spec_labels()
+    for out_col in (STATION_COLUMN, TIME_COLUMN):
+        if labels[out_col] not in columns:
+            raise ValueError(f"{paths[0]} has no column {labels[out_col]}")
+    station, time = columns.index(labels[STATION_COLUMN]), columns.index(labels[TIME_COLUMN])
+    meta = [i for i, label in enumerate(columns) if variables.get(label, {}).get("kind") == "MetaVariable"]
+
+    blocks = [(path, block) for path in paths for block in _station_blocks(path, station, time, meta)]
+
+    def merged():
+        for name in dict.fromkeys(block[0] for _, block in blocks):
+            inputs = [_block_lines(path, block, time, meta) for path, block in blocks if block[0] == name]
+            for _, fields in heapq.merge(*inputs, key=itemgetter(0)):
+                yield fields
+
+    with OdvWriter(outfile, header_text, **writer_options) as writer:
+        writer.write_lines(_merge_lines(merged(), meta if writer_options.get("compact") else []))
+    return writer
+
+
+###all inputs need the same columns and Meta/DataVariables (CreateTime and comments may differ)
+def check_headers(paths: list) -> str:
+    headers = [read_odv_header(path) for path in paths]
+    variables, columns = parse_odv_header(headers[0])
+    for path, header_text in zip(paths[1:], headers[1:]):
+        other_variables, other_columns = parse_odv_header(header_text)
+        if other_columns != columns:
+            raise ValueError(f"columns of {path} differ from {paths[0]}")
+        differ = [
+            label for label in dict.fromkeys([*variables, *other_variables])
+            if variables.get(label) != other_variables.get(label)
+        ]
+        if differ:
+            raise ValueError(f"variables {differ} of {path} differ from {paths[0]}")
+    return headers[0]
+
+
+###fields of a data line (None for an empty line), empty meta fields (compact files) are
+###filled from "last", the meta values of the line before, which is updated
+def _data_fields(line: bytes, meta: list, last: dict) -> list:
+    fields = line.rstrip(b"\r\n").split(b"\t")
+    if fields == [b""]:
+        return None
+    for i in meta:
+        if fields[i]:
+            last[i] = fields[i]
+        else:
+            fields[i] = last.get(i, b"")
+    return fields
+
+
+###(station, start, end, meta before the block) of every block of an ODV file: a new block starts
+###where the station changes or the time goes backwards (appended rows, chunks sorted separately)
+###start/end are (decompressed) byte offsets of its data lines
+def _station_blocks(path: Path, station: int, time: int, meta: list) -> list:
+    blocks = []
+    last = {}
+    previous = None
+    with open_input(path) as f:
+        offset = len(_read_header(f).encode("utf-8"))
+        for line in f:
+            before = dict(last)
+            fields = _data_fields(line, meta, last)
+            if fields is not None:
+                name, t = fields[station], fields[time]
+                if not blocks or blocks[-1][0] != name or t < previous:
+                    blocks.append([name, offset, offset, before])
+                previous = t
+                blocks[-1][2] = offset + len(line)
+            offset += len(line)
+    return blocks
+
+
+###(time, fields) of the data lines of one station block
+def _block_lines(path: Path, block: list, time: int, meta: list):
+    _, start, end, before = block
+    last = dict(before)
+    with open_input(path) as f:
+        if path.suffix.lower() in (".gz", ".zst"):
+            skip = start
+            while skip > 0: #compressed streams are read up to the block
+                data = f.read(min(skip, 1 << 20))
+                if not data:
+                    break
+                skip -= len(data)
+        else:
+            f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            line = f.readline()
+            if not line:
+                break
+            remaining -= len(line)
+            fields = _data_fields(line, meta, last)
+            if fields is not None:
+                yield fields[time], fields
+
+
+###merged fields back to lines, with compaction of the meta fields as in OdvWriter
+def _merge_lines(merged, compact: list):
+    previous = {}
+    for fields in merged:
+        if compact:
+            current = [fields[i] for i in compact]
+            for i, value in zip(compact, current):
+                if previous.get(i) == value:
+                    fields[i] = b""
+            previous = dict(zip(compact, current))
+        yield b"\t".join(fields) + b"\n"
 
 
 ###write output + header
+
 def write_odv_with_header(df_out, header_path: Path, outfile: Path) -> None:
     header_text = header_path.read_text(encoding="utf-8")
+    with OdvWriter(outfile, header_text) as writer:
+        writer.write(df_out)
+
+
+###streaming mode: every chunk goes through the transform and straight to the writer
+def convert_streaming(chunksize: int):
+    current = None
+    chunks = iter_workbook_chunks(INPUT_XLSX, SHEET_NAMES, chunksize, usecols=spec_columns())
+    for name, df_in in chunks:
+        if name != current:
+            print(f"proceccing sheet: {name}")
+            current = name
+        yield transform_one_file(df_in, sheet_name=name)
 
-    #pre
-    # df_out.to_csv(
-    #     outfile,
-    #     sep="\t",
-    #     index=False,
-    #     header=True,
-    #     mode="w",
-    #     encoding="utf-8",
-    #     lineterminator="\n",
-    # )
-
-    
-    #1) write the header (overwrite any existing output)
-    outfile.write_text(header_text.rstrip("\n") + "\n", encoding="utf-8")
-
-    #2) append the data table (no header line from pandas)
-    df_out.to_csv(
-        outfile,
-        sep="\t",
-        index=False,
-        header=False,
-        mode="a",
-        encoding="utf-8",
-        lineterminator="\n",
-    )
-
-
-def main():
-    rows = []
-    for name in SHEET_NAMES:
+
+###serial mode: all sheets from a single workbook load
+def convert_serial(cache: tuple = None):
+    sheets = load_sheets(INPUT_XLSX, SHEET_NAMES, spec_columns(), cache)
+    for name, df_in in sheets.items():
         print(f"proceccing sheet: {name}")
-        df_in = pd.read_excel(INPUT_XLSX, sheet_name=name) 
-        df_in.columns = df_in.columns.str.strip() # remove space
-        rows.append(transform_one_file(df_in, sheet_name=name))
-        #print(df_in.head())
-        
-    df_out = pd.concat(rows, ignore_index=True)
+        yield transform_one_file(df_in, sheet_name=name)
+
+
+###cache = (cache_dir, max_bytes) or None
+def load_sheets(xlsx_path: Path, sheet_names: list, usecols: list, cache: tuple = None) -> dict:
+    if cache is None:
+        return read_workbook(xlsx_path, sheet_names, usecols=usecols)
+    return read_workbook_cached(xlsx_path, sheet_names, usecols, *cache)
+
+
+###one unit of work for the process pool: read + transform a single sheet
+def convert_sheet(task: tuple) -> pd.DataFrame:
+    xlsx_path, sheet_name, usecols, cache = task
+    df_in = load_sheets(xlsx_path, [sheet_name], usecols, cache)[sheet_name]
+    return transform_one_file(df_in, sheet_name=sheet_name)
+
+
+###parallel mode: sheets are converted in a process pool,
+###map() returns the results in task order -> output identical to the serial run
+def convert_parallel(tasks: list, workers: int):
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for task in tasks:
+            print(f"proceccing sheet: {task[1]}")
+        yield from pool.map(convert_sheet, tasks)
+
+
+###---incremental mode---###
+###state per station: last converted timestamp (watermark), number and hash of the rows
+###up to the watermark; a changed hash means older rows were edited -> full rebuild
+def state_file(outfile: Path) -> Path:
+    return outfile.with_name(outfile.name + ".state.json")
+
+
+def load_state(outfile: Path) -> dict:
+    try:
+        return json.loads(state_file(outfile).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_state(outfile: Path, state: dict) -> None:
+    path = state_file(outfile)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(state, indent=1), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _rows_hash(row_hashes: np.ndarray) -> str:
+    return hashlib.sha256(row_hashes.tobytes()).hexdigest()
+
+
+###sinks (e.g. SqliteWriter) get the same rows as the ODV file: only the new ones when appending
+def convert_incremental(outfile: Path, header_text: str, writer_options: dict, cache: tuple = None,
+                        sinks: list = ()) -> None:
+    state = load_state(outfile)
+    options = {"header": header_hash(header_text), "compact": writer_options["compact"]}
+    append = (
+        outfile.exists()
+        and state.get("options") == options
+        and state.get("size") == outfile.stat().st_size #output not modified since the last run
+    )
+    stations = state.get("stations", {})
+
+    sheets = load_sheets(INPUT_XLSX, SHEET_NAMES, spec_columns(), cache)
+    new_rows = {}
+    new_stations = {}
+    for name, df_in in sheets.items():
+        times = date_to_iso(df_in).to_numpy(dtype=object)
+        row_hashes = pd.util.hash_pandas_object(df_in, index=False).to_numpy()
+        known = stations.get(name)
+        if known is None:
+            new_rows[name] = np.ones(len(df_in), dtype=bool)
+        else:
+            old = times <= known["watermark"]
+            if old.sum() != known["rows"] or _rows_hash(row_hashes[old]) != known["rows_hash"]:
+                print(f"older rows of sheet {name} changed -> full rebuild")
+                append = False
+            new_rows[name] = ~old
+        new_stations[name] = {
+            "watermark": max(times) if len(times) else "",
+            "rows": len(df_in),
+            "rows_hash": _rows_hash(row_hashes),
+        }
+
+    if append:
+        with OdvWriter(outfile, header_text, append=True, **writer_options) as writer:
+            for name, df_in in sheets.items():
+                print(f"sheet {name}: appending {new_rows[name].sum()} new rows")
+                if new_rows[name].any():
+                    df_out = transform_one_file(df_in[new_rows[name]], sheet_name=name)
+                    writer.write(df_out)
+                    for sink in sinks:
+                        sink.write(df_out)
+    else:
+        with OdvWriter(outfile, header_text, **writer_options) as writer:
+            for name, df_in in sheets.items():
+                print(f"proceccing sheet: {name}")
+                df_out = transform_one_file(df_in, sheet_name=name)
+                writer.write(df_out)
+                for sink in sinks:
+                    sink.write(df_out)
+    save_state(outfile, {"options": options, "size": outfile.stat().st_size, "stations": new_stations})
+
+
+###pass every frame on to the sinks before it is yielded to the ODV writer
+def tee_frames(frames, sinks: list):
+    for df_out in frames:
+        for sink in sinks:
+            sink.write(df_out)
+        yield df_out
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Convert Helgoland OpenSea xlsx to ODV Generic Spreadsheet")
+    parser.add_argument(
+        "--chunksize", type=int, default=CHUNKSIZE,
+        help="stream the sheets in chunks of N rows (bounded memory)",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=WORKERS,
+        help="convert the sheets in N parallel processes",
+    )
+    parser.add_argument(
+        "--cache-dir", type=Path, default=CACHE_DIR,
+        help="cache parsed sheets as Parquet in this directory (not with --chunksize)",
+    )
+    parser.add_argument(
+        "--cache-max-mb", type=float, default=CACHE_MAX_MB,
+        help="size cap of the sheet cache in MB (LRU eviction)",
+    )
+    parser.add_argument(
+        "--header-file", type=Path, default=HEADER_FILE,
+        help="use this ODV header instead of generating it from SPEC",
+    )
+    parser.add_argument(
+        "--outfile", type=Path, default=OUTFILE,
+        help="output file, a .gz or .zst suffix compresses it",
+    )
+    parser.add_argument(
+        "--compress-level", type=int, default=COMPRESS_LEVEL,
+        help="gzip (1-9) or zstd (1-22) compression level",
+    )
+    parser.add_argument(
+        "--compress-threads", type=int, default=COMPRESS_THREADS,
+        help="compress the output in N threads",
+    )
+    parser.add_argument(
+        "--compact", action="store_true",
+        help="sort the rows of every sheet (every chunk with --chunksize) by time, "
+             "write meta variables only where they change",
+    )
+    parser.add_argument(
+        "--index", action="store_true",
+        help="write a sidecar index OUTFILE.idx.json with byte offsets, row counts and min/max "
+             "of every (station, year) block",
+    )
+    parser.add_argument(
+        "--drop-empty", action="store_true",
+        help="leave out variables that are empty in all sheets (keeps all sheets in memory)",
+    )
+    parser.add_argument(
+        "--split", choices=["station", "station-year"], default=SPLIT,
+        help="write one ODV file per station, or per station and year",
+    )
+    parser.add_argument(
+        "--write-threads", type=int, default=WRITE_THREADS,
+        help="threads writing the files of --split",
+    )
+    parser.add_argument(
+        "--netcdf", type=Path, default=NETCDF_FILE,
+        help="also write a CF timeSeries NetCDF file (needs netCDF4)",
+    )
+    parser.add_argument(
+        "--parquet-dir", type=Path, default=PARQUET_DIR,
+        help="also write a Parquet dataset partitioned by station and year (needs pyarrow)",
+    )
+    parser.add_argument(
+        "--sqlite", type=Path, default=SQLITE_FILE,
+        help="also load the rows into this SQLite database (upsert on station and time)",
+    )
+    parser.add_argument(
+        "--merge", type=Path, nargs="+", metavar="IN",
+        help="merge ODV files into OUTFILE, one block per station with the rows ordered by time, "
+             "instead of converting the workbook",
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="append only rows newer than the last run (state in OUTFILE.state.json), "
+             "rebuild if older rows changed",
+    )
+    args = parser.parse_args(argv)
+    if args.workers > 1 and args.chunksize:
+        parser.error("--workers cannot be combined with --chunksize")
+    if args.cache_dir is not None and args.chunksize:
+        parser.error("--cache-dir cannot be combined with --chunksize (the streaming reader does not use the cache)")
+    if args.incremental and (
+        args.chunksize or args.workers > 1 or args.drop_empty or args.split or args.netcdf or args.parquet_dir
+    ):
+        parser.error(
+            "--incremental cannot be combined with --chunksize, --workers, --drop-empty, --split, "
+            "--netcdf or --parquet-dir"
+        )
+    if args.merge and (
+        args.incremental or args.chunksize or args.workers > 1 or args.drop_empty or args.split or args.index
+        or args.netcdf or args.parquet_dir or args.sqlite
+    ):
+        parser.error("--merge only goes with --outfile, --compact and the compression options")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    cache = None
+    if args.cache_dir is not None:
+        cache = (args.cache_dir, int(args.cache_max_mb * 1024 * 1024))
+
+    if args.header_file is not None:
+        header_text = args.header_file.read_text(encoding="utf-8")
+    else:
+        header_text = render_header()
+    writer_options = dict(
+        compress_level=args.compress_level, compress_threads=args.compress_threads, compact=args.compact,
+        index=args.index,
+    )
+
+    if args.merge:
+        try:
+            writer = merge_odv(args.merge, args.outfile, **writer_options)
+        except ValueError as err: #incompatible or unordered inputs
+            sys.exit(f"{Path(sys.argv[0]).name}: error: {err}")
+        print(f"{args.outfile}: {'written' if writer.changed else 'unchanged'}")
+        return
+
+    if args.incremental:
+        with ExitStack() as sinks:
+            extra = []
+            if args.sqlite is not None:
+                extra.append(sinks.enter_context(SqliteWriter(args.sqlite)))
+            convert_incremental(args.outfile, header_text, writer_options, cache, sinks=extra)
+        return
+
+    if args.chunksize:
+        frames = convert_streaming(args.chunksize)
+    elif args.workers > 1:
+        tasks = [(INPUT_XLSX, name, spec_columns(), cache) for name in SHEET_NAMES]
+        frames = convert_parallel(tasks, args.workers)
+    else:
+        frames = convert_serial(cache)
+
+    if args.drop_empty:
+        #all frames are needed to know which columns stay empty
+        frames = list(frames)
+        empty = empty_columns(frames, header_text)
+        if empty:
+            print(f"dropping empty columns: {', '.join(empty)}")
+            header_text = drop_header_columns(header_text, empty)
+            frames = [df_out.drop(columns=[c for c in empty if c in df_out.columns]) for df_out in frames]
+
+    with ExitStack() as sinks:
+        #further outputs get every frame the ODV writer gets
+        extra = []
+        if args.netcdf is not None:
+            extra.append(sinks.enter_context(NetcdfWriter(args.netcdf)))
+        if args.parquet_dir is not None:
+            extra.append(sinks.enter_context(ParquetDatasetWriter(args.parquet_dir)))
+        if args.sqlite is not None:
+            extra.append(sinks.enter_context(SqliteWriter(args.sqlite)))
+        if extra:
+            frames = tee_frames(frames, extra)
 
-    #print(df_out.head())
+        ###write to disc, every sheet (or chunk) as soon as it is converted
+        if args.split:
+            writers = write_split(
+                frames, args.outfile, header_text, by_year=args.split == "station-year",
+                threads=args.write_threads, **writer_options,
+            )
+            for writer in writers:
+                print(f"{writer.outfile}: {'written' if writer.changed else 'unchanged'}")
+            return
 
-    ###write to disc
-    write_odv_with_header(df_out, HEADER_FILE, OUTFILE)
+        with OdvWriter(args.outfile, header_text, **writer_options) as writer:
+            for df_out in frames:
+                writer.write(df_out)
+        if not writer.changed:
+            print(f"{args.outfile} is unchanged, kept the existing file")
 
 
 
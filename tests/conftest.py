@@ -0,0 +1,52 @@
+import datetime as dt
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import OpenSeaData2ODV as odv  # noqa: E402
+
+
+MAX_ROWS = 1000
+
+
+###synthetic workbook with the input columns of SPEC: one sheet per station,
+###one row per day from 2020-01-01, a time of day on most rows, random values with gaps
+###the values do not depend on rows -> a workbook with more rows only adds rows at the end
+def make_workbook(path: Path, rows: int = 40, seed: int = 0) -> Path:
+    rng = np.random.default_rng(seed)
+    with pd.ExcelWriter(path) as xw:
+        for k, name in enumerate(odv.SHEET_NAMES):
+            days = pd.date_range("2020-01-01", periods=rows, freq="D")
+            df = pd.DataFrame({
+                "Year": days.year, "Month": days.month, "Day": days.day,
+                "Time": [dt.time(8 + i % 3, 30) if i % 7 else None for i in range(rows)],
+            })
+            for c in odv.spec_columns():
+                if c in df.columns:
+                    continue
+                if c.startswith("QV:"):
+                    df[c] = rng.integers(0, 5, MAX_ROWS)[:rows]
+                elif odv.input_dtypes()[c] == "object":
+                    df[c] = rng.choice(["sunny", "cloudy", None, "rain"], MAX_ROWS)[:rows]
+                elif c.startswith("Longitude"):
+                    df[c] = 7.8833
+                elif c.startswith("Latitude"):
+                    df[c] = 54.1833 + k * 0.001
+                else:
+                    values = rng.normal(10, 3, MAX_ROWS).round(3)
+                    values[::11] = np.nan
+                    df[c] = values[:rows]
+            df.to_excel(xw, sheet_name=name, index=False)
+    return path
+
+
+###runs in an empty directory holding the input workbook under its default name
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    make_workbook(tmp_path / odv.INPUT_XLSX)
+    return tmp_path
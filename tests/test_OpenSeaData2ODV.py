@@ -0,0 +1,136 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import OpenSeaData2ODV as odv
+from conftest import make_workbook
+
+
+###ODV content without the CreateTime line
+def content(path) -> str:
+    return odv.odv_content_hash(Path(path))
+
+
+###data rows sorted by station and time, for comparing outputs written in a different order
+def sorted_rows(path) -> pd.DataFrame:
+    df = odv.read_odv(Path(path)).astype(object)
+    return df.sort_values([odv.STATION_COLUMN, odv.TIME_COLUMN], kind="stable").reset_index(drop=True)
+
+
+def edit_cell(xlsx: Path, sheet: str, row: int, column: str, value) -> None:
+    sheets = pd.read_excel(xlsx, sheet_name=None)
+    sheets[sheet].loc[row, column] = value
+    with pd.ExcelWriter(xlsx) as xw:
+        for name, df in sheets.items():
+            df.to_excel(xw, sheet_name=name, index=False)
+
+
+def test_modes_give_the_same_output(workdir):
+    odv.main(["--outfile", "serial.txt"])
+    odv.main(["--chunksize", "7", "--outfile", "chunks.txt"])
+    odv.main(["--workers", "2", "--outfile", "workers.txt"])
+    assert content("serial.txt") == content("chunks.txt") == content("workers.txt")
+
+
+def test_cache_gives_the_same_output(workdir):
+    pytest.importorskip("pyarrow")
+    odv.main(["--outfile", "serial.txt"])
+    odv.main(["--cache-dir", "cache", "--outfile", "parsed.txt"])
+    odv.main(["--cache-dir", "cache", "--outfile", "cached.txt"])
+    assert content("serial.txt") == content("parsed.txt") == content("cached.txt")
+
+
+def test_unchanged_output_is_not_rewritten(workdir, capsys):
+    odv.main(["--outfile", "out.txt"])
+    mtime = Path("out.txt").stat().st_mtime_ns
+    odv.main(["--outfile", "out.txt"])
+    assert Path("out.txt").stat().st_mtime_ns == mtime
+    assert "unchanged" in capsys.readouterr().out
+
+
+def test_incremental_appends_new_rows(workdir, capsys):
+    odv.main(["--incremental", "--outfile", "inc.txt"])
+    before = Path("inc.txt").read_bytes()
+    make_workbook(odv.INPUT_XLSX, rows=45)
+    odv.main(["--incremental", "--outfile", "inc.txt"])
+    assert "appending 5 new rows" in capsys.readouterr().out
+    assert Path("inc.txt").read_bytes().startswith(before)
+
+    odv.main(["--outfile", "full.txt"])
+    pd.testing.assert_frame_equal(sorted_rows("inc.txt"), sorted_rows("full.txt"))
+
+
+def test_incremental_rebuilds_after_an_older_row_changed(workdir, capsys):
+    odv.main(["--incremental", "--outfile", "inc.txt"])
+    edit_cell(odv.INPUT_XLSX, odv.SHEET_NAMES[0], 3, "pH-value", 1.23)
+    odv.main(["--incremental", "--outfile", "inc.txt"])
+    assert "full rebuild" in capsys.readouterr().out
+    odv.main(["--outfile", "full.txt"])
+    assert content("inc.txt") == content("full.txt")
+
+
+def test_failed_append_is_truncated(workdir):
+    odv.main(["--outfile", "out.txt"])
+    before = Path("out.txt").read_bytes()
+    sheet = odv.SHEET_NAMES[0]
+    df_in = odv.read_workbook(odv.INPUT_XLSX, [sheet], odv.spec_columns())[sheet]
+    df_out = odv.transform_one_file(df_in, sheet_name=sheet)
+    with pytest.raises(RuntimeError):
+        with odv.OdvWriter(Path("out.txt"), odv.render_header(), append=True) as writer:
+            writer.write(df_out)
+            raise RuntimeError("conversion failed")
+    assert Path("out.txt").read_bytes() == before
+
+
+def test_index_blocks_point_at_their_rows(workdir):
+    odv.main(["--index", "--outfile", "out.txt"])
+    index = odv.load_index(Path("out.txt"))
+    data = Path("out.txt").read_bytes()
+    assert [b["station"] for b in index["blocks"]] == odv.SHEET_NAMES
+    for block in index["blocks"]:
+        lines = data[block["offset"]:block["end"]].decode().splitlines()
+        assert len(lines) == block["rows"]
+        assert all(line.split("\t")[1] == block["station"] for line in lines)
+
+
+def test_edited_file_invalidates_the_index(workdir):
+    odv.main(["--index", "--outfile", "out.txt"])
+    assert odv.load_index(Path("out.txt")) is not None
+    #same size, different content
+    header, body = Path("out.txt").read_bytes().split(b"\n" + odv.CRUISE_NAME.encode(), 1)
+    body = body.replace(b"\tsunny\t", b"\tcloud\t", 1)
+    Path("out.txt").write_bytes(header + b"\n" + odv.CRUISE_NAME.encode() + body)
+    assert odv.load_index(Path("out.txt")) is None
+
+
+def test_rewrite_without_index_removes_the_index(workdir):
+    odv.main(["--index", "--outfile", "out.txt"])
+    edit_cell(odv.INPUT_XLSX, odv.SHEET_NAMES[0], 3, "pH-value", 1.23)
+    odv.main(["--outfile", "out.txt"])
+    assert not odv.index_file(Path("out.txt")).exists()
+
+
+def test_merge_of_split_outputs_matches_a_full_conversion(workdir):
+    make_workbook(odv.INPUT_XLSX, rows=400) #two years per station
+    odv.main(["--outfile", "full.txt"])
+    odv.main(["--split", "station-year", "--outfile", "part.txt"])
+    parts = sorted(Path().glob("part_*.txt"), reverse=True)
+    assert len(parts) == 2 * len(odv.SHEET_NAMES)
+    odv.main(["--merge", *map(str, parts), "--outfile", "merged.txt"])
+    pd.testing.assert_frame_equal(sorted_rows("merged.txt"), sorted_rows("full.txt"))
+
+    #every station in one block, in time order
+    merged = odv.read_odv(Path("merged.txt"))
+    stations = merged[odv.STATION_COLUMN]
+    assert stations.ne(stations.shift()).fillna(True).sum() == len(odv.SHEET_NAMES)
+    assert merged.groupby(stations, sort=False)[odv.TIME_COLUMN].apply(lambda t: t.is_monotonic_increasing).all()
+
+
+def test_merge_of_an_appended_file_matches_a_full_conversion(workdir):
+    odv.main(["--incremental", "--outfile", "inc.txt"])
+    make_workbook(odv.INPUT_XLSX, rows=45)
+    odv.main(["--incremental", "--outfile", "inc.txt"])
+    odv.main(["--merge", "inc.txt", "--outfile", "merged.txt"])
+    odv.main(["--outfile", "full.txt"])
+    assert content("merged.txt") == content("full.txt")